@@ -247,7 +247,7 @@ def eval_rho2(mol, ao, mo_coeff, mo_occ, non0tab=None, xctype='LDA',
     ao_loc = mol.ao_loc_nr()
     pos = mo_occ > OCCDROP
     if pos.sum() > 0:
-        cpos = numpy.einsum('ij,j->ij', mo_coeff[:,pos], numpy.sqrt(mo_occ[pos]))
+        cpos = mo_coeff[:,pos] * numpy.sqrt(mo_occ[pos])
         if xctype == 'LDA' or xctype == 'HF':
             c0 = _dot_ao_dm(mol, ao, cpos, non0tab, shls_slice, ao_loc)
             #:rho = numpy.einsum('pi,pi->p', c0, c0)
@@ -293,7 +293,7 @@ def eval_rho2(mol, ao, mo_coeff, mo_occ, non0tab=None, xctype='LDA',
 
     neg = mo_occ < -OCCDROP
     if neg.sum() > 0:
-        cneg = numpy.einsum('ij,j->ij', mo_coeff[:,neg], numpy.sqrt(-mo_occ[neg]))
+        cneg = mo_coeff[:,neg] * numpy.sqrt(-mo_occ[neg])
         if xctype == 'LDA' or xctype == 'HF':
             c0 = _dot_ao_dm(mol, ao, cneg, non0tab, shls_slice, ao_loc)
             #:rho -= numpy.einsum('pi,pi->p', c0, c0)
@@ -534,13 +534,20 @@ def eval_mat(mol, ao, weight, rho, vxc,
         aow = _scale_ao(ao[3], wv, out=aow)
         mat += _dot_ao_ao(mol, ao[3], aow, non0tab, shls_slice, ao_loc)
 
-    return mat + mat.T.conj()
+    return lib.hermi_sum(mat, inplace=True)
 
 
 def _dot_ao_ao(mol, ao1, ao2, non0tab, shls_slice, ao_loc, hermi=0):
     '''return numpy.dot(ao1.T, ao2)'''
     ngrids, nao = ao1.shape
     if nao < SWITCH_SIZE:
+        if (ao1.dtype == ao2.dtype == numpy.complex128 and
+            ao1.flags.f_contiguous and ao2.flags.f_contiguous):
+            # ZGEMM with the conjugate transpose avoids the copy ao1.T.conj().
+            # BLAS returns (ao2^H ao1) in Fortran order, i.e. the C-ordered
+            # array conj(ao1^H ao2)
+            vv = scipy.linalg.blas.zgemm(1., ao2, ao1, trans_a=2).T
+            return numpy.conj(vv, out=vv)
         return lib.dot(ao1.T.conj(), ao2)
 
     if not ao1.flags.f_contiguous:
@@ -616,7 +623,7 @@ def _scale_ao(ao, wv, out=None):
     aow = numpy.ndarray((nao,ngrids), dtype=ao.dtype, buffer=out).T
 
     if not ao.flags.c_contiguous:
-        aow = numpy.einsum('nip,np->pi', ao, wv)
+        aow = _scale_ao_fallback(ao, wv)
     elif aow.dtype == numpy.double:
         libdft.VXC_dscale_ao(aow.ctypes.data_as(ctypes.c_void_p),
                              ao.ctypes.data_as(ctypes.c_void_p),
@@ -630,9 +637,20 @@ def _scale_ao(ao, wv, out=None):
                              ctypes.c_int(comp), ctypes.c_int(nao),
                              ctypes.c_int(ngrids))
     else:
-        aow = numpy.einsum('nip,np->pi', ao, wv)
+        aow = _scale_ao_fallback(ao, wv)
     return aow
 
+def _scale_ao_fallback(ao, wv):
+    #:aow = numpy.einsum('nip,np->pi', ao, wv)
+    # comp is at most 4 (or 1 for LDA).  Unrolling the sum over comp avoids
+    # the generic einsum loops and needs only one scratch buffer.
+    aow = ao[0] * wv[0]
+    if len(ao) > 1:
+        buf = numpy.empty_like(aow)
+        for i in range(1, len(ao)):
+            aow += numpy.multiply(ao[i], wv[i], out=buf)
+    return aow.T
+
 def _contract_rho(bra, ket):
     #:rho  = numpy.einsum('pi,pi->p', bra.real, ket.real)
     #:rho += numpy.einsum('pi,pi->p', bra.imag, ket.imag)
@@ -642,8 +660,7 @@ def _contract_rho(bra, ket):
     rho = numpy.empty(ngrids)
 
     if not (bra.flags.c_contiguous and ket.flags.c_contiguous):
-        rho  = numpy.einsum('ip,ip->p', bra.real, ket.real)
-        rho += numpy.einsum('ip,ip->p', bra.imag, ket.imag)
+        rho = _contract_rho_fallback(bra, ket)
     elif bra.dtype == numpy.double and ket.dtype == numpy.double:
         libdft.VXC_dcontract_rho(rho.ctypes.data_as(ctypes.c_void_p),
                                  bra.ctypes.data_as(ctypes.c_void_p),
@@ -655,7 +672,16 @@ def _contract_rho(bra, ket):
                                  ket.ctypes.data_as(ctypes.c_void_p),
                                  ctypes.c_int(nao), ctypes.c_int(ngrids))
     else:
-        rho  = numpy.einsum('ip,ip->p', bra.real, ket.real)
+        rho = _contract_rho_fallback(bra, ket)
+    return rho
+
+def _contract_rho_fallback(bra, ket):
+    #:rho  = numpy.einsum('ip,ip->p', bra.real, ket.real)
+    #:rho += numpy.einsum('ip,ip->p', bra.imag, ket.imag)
+    # .imag of a real array is a newly allocated array of zeros.  Skip the
+    # imaginary part unless both bra and ket are complex.
+    rho = numpy.einsum('ip,ip->p', bra.real, ket.real)
+    if numpy.iscomplexobj(bra) and numpy.iscomplexobj(ket):
         rho += numpy.einsum('ip,ip->p', bra.imag, ket.imag)
     return rho
 
@@ -106,6 +106,13 @@ class KnownValues(unittest.TestCase):
         v2 = dft.numint._dot_ao_ao(h4, ao, ao, None, None, None)
         self.assertAlmostEqual(abs(v1-v2).max(), 0, 9)
 
+        numpy.random.seed(1)
+        ao1 = numpy.asarray(ao * numpy.exp(1j*numpy.random.random(nao)), order='F')
+        ao2 = numpy.asarray(ao * numpy.exp(1j*numpy.random.random(nao)), order='F')
+        v1 = dft.numint._dot_ao_ao(h4, ao1, ao2, None, None, None)
+        self.assertTrue(v1.flags.c_contiguous)
+        self.assertAlmostEqual(abs(v1 - ao1.conj().T.dot(ao2)).max(), 0, 9)
+
     def test_dot_ao_ao_high_cost(self):
         non0tab = mf.grids.make_mask(mol, mf.grids.coords)
         ao = dft.numint.eval_ao(mol, mf.grids.coords, deriv=1)
@@ -743,6 +743,14 @@ def dot(a, b, alpha=1, c=None, beta=0):
         return zdot(a, b, alpha, c, beta)
 
     elif atype == numpy.float64 and btype == numpy.complex128:
+        if (b.flags.c_contiguous and _real_scalars(alpha, beta) and
+            (c is None or (c.dtype == numpy.complex128 and c.flags.c_contiguous))):
+            # b (k,n) is viewed as a real matrix (k,2n) with real and imaginary
+            # parts interleaved.  One DGEMM without copying b.real and b.imag
+            if c is not None:
+                c = c.view(numpy.double)
+            return ddot(a, b.view(numpy.double), alpha, c, beta).view(numpy.complex128)
+
         if b.flags.f_contiguous:
             order = 'F'
         else:
@@ -760,6 +768,13 @@ def dot(a, b, alpha=1, c=None, beta=0):
         return ab
 
     elif atype == numpy.complex128 and btype == numpy.float64:
+        if (a.flags.f_contiguous and _real_scalars(alpha, beta) and
+            (c is None or (c.dtype == numpy.complex128 and c.flags.f_contiguous))):
+            # (a b).T = b.T a.T where a.T (k,m) is viewed as a real matrix (k,2m)
+            if c is not None:
+                c = c.T.view(numpy.double)
+            return ddot(b.T, a.T.view(numpy.double), alpha, c, beta).view(numpy.complex128).T
+
         if a.flags.f_contiguous:
             order = 'F'
         else:
@@ -786,6 +801,9 @@ def dot(a, b, alpha=1, c=None, beta=0):
             c += numpy.dot(a, b) * alpha
         return c
 
+def _real_scalars(*scalars):
+    return not any(numpy.iscomplexobj(x) for x in scalars)
+
 # a, b, c in C-order
 def _dgemm(trans_a, trans_b, m, n, k, a, b, c, alpha=1, beta=0,
            offseta=0, offsetb=0, offsetc=0):
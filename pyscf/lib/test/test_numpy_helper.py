@@ -164,6 +164,13 @@ class KnownValues(unittest.TestCase):
         self.assertTrue(numpy.allclose(numpy.dot(a+b*1j, c+d*1j), lib.dot(a+b*1j, c+d*1j)))
         self.assertTrue(numpy.allclose(numpy.dot(a, c+d*1j), lib.dot(a, c+d*1j)))
         self.assertTrue(numpy.allclose(numpy.dot(a+b*1j, c), lib.dot(a+b*1j, c)))
+        self.assertTrue(numpy.allclose(numpy.dot(a.T, c+d*1j), lib.dot(a.T, c+d*1j)))
+        self.assertTrue(numpy.allclose(numpy.dot((a+b*1j).T, c), lib.dot((a+b*1j).T, c)))
+        e = numpy.ones((400,400), dtype=numpy.complex128)
+        ref = numpy.dot(a, c+d*1j) * .5 + e * .2
+        self.assertTrue(numpy.allclose(ref, lib.dot(a, c+d*1j, .5, e.copy(), .2)))
+        ref = numpy.dot((a+b*1j).T, c) * .5 + e * .2
+        self.assertTrue(numpy.allclose(ref, lib.dot((a+b*1j).T, c, .5, e.copy('F'), .2)))
 
     def test_cartesian_prod(self):
         arrs = (range(3,9), range(4))
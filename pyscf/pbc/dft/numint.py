@@ -21,6 +21,7 @@ import sys
 import ctypes
 import numpy
 from pyscf import lib
+from pyscf.lib import logger
 from pyscf.dft import numint
 from pyscf.dft.numint import eval_mat, _dot_ao_ao, _dot_ao_dm
 from pyscf.dft.numint import _scale_ao, _contract_rho
@@ -29,6 +30,7 @@ from pyscf.dft.numint import _uks_gga_wv0, _uks_gga_wv1
 from pyscf.dft.numint import OCCDROP
 from pyscf.pbc.dft.gen_grid import libpbc, make_mask, BLKSIZE
 from pyscf.pbc.lib.kpts_helper import is_zero, gamma_point, member
+from pyscf import __config__
 
 #try:
 ### Moderate speedup by caching eval_ao
@@ -141,11 +143,16 @@ def eval_rho(cell, ao, dm, non0tab=None, xctype='LDA', hermi=0, verbose=None):
                               dtype=numpy.uint8)
         non0tab[:] = 0xff
 
-    # complex orbitals or density matrix
-    if numpy.iscomplexobj(ao) or numpy.iscomplexobj(dm):
+    # complex orbitals
+    if numpy.iscomplexobj(ao):
         shls_slice = (0, cell.nbas)
         ao_loc = cell.ao_loc_nr()
-        dm = dm.astype(numpy.complex128)
+        if numpy.iscomplexobj(dm) and dm.imag.any():
+            dm = numpy.asarray(dm, dtype=numpy.complex128)
+        else:
+            # A real DM (e.g. the closed-shell DM at gamma point) is kept real
+            # so that ao*dm is computed by the cheaper real x complex GEMM.
+            dm = numpy.asarray(dm.real, dtype=numpy.double, order='C')
 # For GGA, function eval_rho returns   real(|\nabla i> D_ij <j| + |i> D_ij <\nabla j|)
 #       = real(|\nabla i> D_ij <j| + |i> D_ij <\nabla j|)
 #       = real(|\nabla i> D_ij <j| + conj(|\nabla j> conj(D_ij) < i|))
@@ -154,43 +161,46 @@ def eval_rho(cell, ao, dm, non0tab=None, xctype='LDA', hermi=0, verbose=None):
 # symmetrization dm (D + D.conj().T) then /2 because the code below computes
 #       2*real(|\nabla i> D_ij <j|)
         if not hermi:
-            dm = (dm + dm.conj().T) * .5
-
-        def dot_bra(bra, aodm):
-            #:rho  = numpy.einsum('pi,pi->p', bra.real, aodm.real)
-            #:rho += numpy.einsum('pi,pi->p', bra.imag, aodm.imag)
-            #:return rho
-            return _contract_rho(bra, aodm)
+            dm = dm + dm.conj().T
+            dm *= .5
 
         if xctype == 'LDA' or xctype == 'HF':
             c0 = _dot_ao_dm(cell, ao, dm, non0tab, shls_slice, ao_loc)
-            rho = dot_bra(ao, c0)
+            # _contract_rho sums re*re + im*im in one pass over ao and c0
+            #:rho  = numpy.einsum('pi,pi->p', ao.real, c0.real)
+            #:rho += numpy.einsum('pi,pi->p', ao.imag, c0.imag)
+            rho = _contract_rho(ao, c0)
 
         elif xctype == 'GGA':
             rho = numpy.empty((4,ngrids))
             c0 = _dot_ao_dm(cell, ao[0], dm, non0tab, shls_slice, ao_loc)
-            rho[0] = dot_bra(ao[0], c0)
+            rho[0] = _contract_rho(ao[0], c0)
             for i in range(1, 4):
-                rho[i] = dot_bra(ao[i], c0) * 2
+                rho[i] = _contract_rho(ao[i], c0) * 2
 
         else:
             # rho[4] = \nabla^2 rho, rho[5] = 1/2 |nabla f|^2
             rho = numpy.empty((6,ngrids))
             c0 = _dot_ao_dm(cell, ao[0], dm, non0tab, shls_slice, ao_loc)
-            rho[0] = dot_bra(ao[0], c0)
+            rho[0] = _contract_rho(ao[0], c0)
             rho[5] = 0
             for i in range(1, 4):
-                rho[i] = dot_bra(ao[i], c0) * 2  # *2 for +c.c.
+                rho[i] = _contract_rho(ao[i], c0) * 2  # *2 for +c.c.
                 c1 = _dot_ao_dm(cell, ao[i], dm, non0tab, shls_slice, ao_loc)
-                rho[5] += dot_bra(ao[i], c1)
+                rho[5] += _contract_rho(ao[i], c1)
             XX, YY, ZZ = 4, 7, 9
-            ao2 = ao[XX] + ao[YY] + ao[ZZ]
-            rho[4] = dot_bra(ao2, c0)
+            ao2 = ao[XX] + ao[YY]
+            ao2 += ao[ZZ]
+            rho[4] = _contract_rho(ao2, c0)
             rho[4] += rho[5]
             rho[4] *= 2 # *2 for +c.c.
             rho[5] *= .5
     else:
-        # real orbitals and real DM
+        # Real orbitals (gamma point). Only the real part of the DM contributes
+        # to real(|i> D_ij <j|), so that the real code path applies to complex
+        # DM as well.
+        if numpy.iscomplexobj(dm):
+            dm = numpy.asarray(dm.real, order='C')
         rho = numint.eval_rho(cell, ao, dm, non0tab, xctype, hermi, verbose)
     return rho
 
@@ -220,70 +230,56 @@ def eval_rho2(cell, ao, mo_coeff, mo_occ, non0tab=None, xctype='LDA',
         shls_slice = (0, cell.nbas)
         ao_loc = cell.ao_loc_nr()
         pos = mo_occ > OCCDROP
-        cpos = numpy.einsum('ij,j->ij', mo_coeff[:,pos], numpy.sqrt(mo_occ[pos]))
-
-        if pos.sum() > 0:
-            if xctype == 'LDA' or xctype == 'HF':
-                c0 = _dot_ao_dm(cell, ao, cpos, non0tab, shls_slice, ao_loc)
-                rho = dot(c0, c0)
-            elif xctype == 'GGA':
-                rho = numpy.empty((4,ngrids))
-                c0 = _dot_ao_dm(cell, ao[0], cpos, non0tab, shls_slice, ao_loc)
-                rho[0] = dot(c0, c0)
-                for i in range(1, 4):
-                    c1 = _dot_ao_dm(cell, ao[i], cpos, non0tab, shls_slice, ao_loc)
-                    rho[i] = dot(c0, c1) * 2  # *2 for +c.c.
-            else: # meta-GGA
-                # rho[4] = \nabla^2 rho, rho[5] = 1/2 |nabla f|^2
-                rho = numpy.empty((6,ngrids))
-                c0 = _dot_ao_dm(cell, ao[0], cpos, non0tab, shls_slice, ao_loc)
-                rho[0] = dot(c0, c0)
-                rho[5] = 0
-                for i in range(1, 4):
-                    c1 = _dot_ao_dm(cell, ao[i], cpos, non0tab, shls_slice, ao_loc)
-                    rho[i] = dot(c0, c1) * 2  # *2 for +c.c.
-                    rho[5]+= dot(c1, c1)
-                XX, YY, ZZ = 4, 7, 9
-                ao2 = ao[XX] + ao[YY] + ao[ZZ]
-                c1 = _dot_ao_dm(cell, ao2, cpos, non0tab, shls_slice, ao_loc)
-                rho[4] = dot(c0, c1)
-                rho[4]+= rho[5]
-                rho[4]*= 2
-                rho[5]*= .5
-        else:
+        neg = mo_occ < -OCCDROP
+        npos = numpy.count_nonzero(pos)
+        nneg = numpy.count_nonzero(neg)
+        # Orbitals of positive and negative occupancies are stacked so that
+        # the AO->MO transformation is one complex GEMM per AO component.
+        cocc = numpy.hstack((mo_coeff[:,pos] * numpy.sqrt(mo_occ[pos]),
+                             mo_coeff[:,neg] * numpy.sqrt(-mo_occ[neg])))
+
+        def dot_occ(bra, ket):
+            rho = 0
+            if npos > 0:
+                rho = dot(bra[:,:npos], ket[:,:npos])
+            if nneg > 0:
+                rho = rho - dot(bra[:,npos:], ket[:,npos:])
+            return rho
+
+        if npos + nneg == 0:
             if xctype == 'LDA' or xctype == 'HF':
                 rho = numpy.zeros(ngrids)
             elif xctype == 'GGA':
                 rho = numpy.zeros((4,ngrids))
             else:
                 rho = numpy.zeros((6,ngrids))
-
-        neg = mo_occ < -OCCDROP
-        if neg.sum() > 0:
-            cneg = numpy.einsum('ij,j->ij', mo_coeff[:,neg], numpy.sqrt(-mo_occ[neg]))
-            if xctype == 'LDA' or xctype == 'HF':
-                c0 = _dot_ao_dm(cell, ao, cneg, non0tab, shls_slice, ao_loc)
-                rho -= dot(c0, c0)
-            elif xctype == 'GGA':
-                c0 = _dot_ao_dm(cell, ao[0], cneg, non0tab, shls_slice, ao_loc)
-                rho[0] -= dot(c0, c0)
-                for i in range(1, 4):
-                    c1 = _dot_ao_dm(cell, ao[i], cneg, non0tab, shls_slice, ao_loc)
-                    rho[i] -= dot(c0, c1) * 2  # *2 for +c.c.
-            else:
-                c0 = _dot_ao_dm(cell, ao[0], cneg, non0tab, shls_slice, ao_loc)
-                rho[0] -= dot(c0, c0)
-                rho5 = 0
-                for i in range(1, 4):
-                    c1 = _dot_ao_dm(cell, ao[i], cneg, non0tab, shls_slice, ao_loc)
-                    rho[i] -= dot(c0, c1) * 2  # *2 for +c.c.
-                    rho5 -= dot(c1, c1)
-                XX, YY, ZZ = 4, 7, 9
-                ao2 = ao[XX] + ao[YY] + ao[ZZ]
-                c1 = _dot_ao_dm(cell, ao2, cneg, non0tab, shls_slice, ao_loc)
-                rho[4] -= dot(c0, c1) * 2
-                rho[4] -= rho5 * 2
-                rho[5] -= rho5 * .5
+        elif xctype == 'LDA' or xctype == 'HF':
+            c0 = _dot_ao_dm(cell, ao, cocc, non0tab, shls_slice, ao_loc)
+            rho = dot_occ(c0, c0)
+        elif xctype == 'GGA':
+            rho = numpy.empty((4,ngrids))
+            c0 = _dot_ao_dm(cell, ao[0], cocc, non0tab, shls_slice, ao_loc)
+            rho[0] = dot_occ(c0, c0)
+            for i in range(1, 4):
+                c1 = _dot_ao_dm(cell, ao[i], cocc, non0tab, shls_slice, ao_loc)
+                rho[i] = dot_occ(c0, c1) * 2  # *2 for +c.c.
+        else: # meta-GGA
+            # rho[4] = \nabla^2 rho, rho[5] = 1/2 |nabla f|^2
+            rho = numpy.empty((6,ngrids))
+            c0 = _dot_ao_dm(cell, ao[0], cocc, non0tab, shls_slice, ao_loc)
+            rho[0] = dot_occ(c0, c0)
+            rho[5] = 0
+            for i in range(1, 4):
+                c1 = _dot_ao_dm(cell, ao[i], cocc, non0tab, shls_slice, ao_loc)
+                rho[i] = dot_occ(c0, c1) * 2  # *2 for +c.c.
+                rho[5]+= dot_occ(c1, c1)
+            XX, YY, ZZ = 4, 7, 9
+            ao2 = ao[XX] + ao[YY] + ao[ZZ]
+            c1 = _dot_ao_dm(cell, ao2, cocc, non0tab, shls_slice, ao_loc)
+            rho[4] = dot_occ(c0, c1)
+            rho[4]+= rho[5]
+            rho[4]*= 2
+            rho[5]*= .5
     else:
         rho = numint.eval_rho2(cell, ao, mo_coeff, mo_occ, non0tab, xctype, verbose)
     return rho
@@ -352,8 +348,8 @@ def nr_rks(ni, cell, grids, xc_code, dms, spin=0, relativity=0, hermi=0,
                 vrho = vxc[0]
                 den = rho*weight
                 nelec[i] += den.sum()
-                excsum[i] += (den*exc).sum()
-                vmat[i] += ni.eval_mat(cell, ao_k1, weight, rho, vxc,
+                excsum[i] += numpy.dot(den, exc)
+                vmat[i] += ni.eval_mat(cell, ao_k1, weight, rho, vrho,
                                        mask, xctype, 0, verbose)
     elif xctype == 'GGA':
         ao_deriv = 1
@@ -879,6 +875,34 @@ def _fxc_mat(cell, ao, wv, non0tab, xctype, ao_loc):
         mat = _dot_ao_ao(cell, ao[0], aow, non0tab, shls_slice, ao_loc)
     return mat
 
+def _eval_mat_lda_kpts(cell, ao_kpts, weight, vxc, non0tab):
+    '''LDA XC potential matrices for AOs of a list of k-points.  The same as
+    calling eval_mat for each k-point, but the grid weights are computed once
+    and the scaled AOs of all k-points share one buffer.
+    '''
+    if not isinstance(vxc, numpy.ndarray) or vxc.ndim == 2:
+        vrho = vxc[0]
+    else:
+        vrho = vxc
+    nkpts = len(ao_kpts)
+    ngrids, nao = ao_kpts[0].shape
+    shls_slice = (0, cell.nbas)
+    ao_loc = cell.ao_loc_nr()
+    # *.5 because return mat + mat.T
+    wv = numpy.multiply(weight, vrho)
+    wv *= .5
+
+    dtype = numpy.result_type(*ao_kpts)
+    mat = numpy.empty((nkpts,nao,nao), dtype=dtype)
+    buf = numpy.empty((nao,ngrids), dtype=dtype)
+    for k in range(nkpts):
+        ao = ao_kpts[k]
+        #:aow = numpy.einsum('pi,p->pi', ao, wv)
+        aow = _scale_ao(ao, wv, out=buf)
+        mat[k] = _dot_ao_ao(cell, ao, aow, non0tab, shls_slice, ao_loc)
+        lib.hermi_sum(mat[k], inplace=True)
+    return mat
+
 def cache_xc_kernel(ni, cell, grids, xc_code, mo_coeff, mo_occ, spin=0,
                     kpts=None, max_memory=2000):
     '''Compute the 0th order density, Vxc and fxc.  They can be used in TDDFT,
@@ -893,21 +917,33 @@ def cache_xc_kernel(ni, cell, grids, xc_code, mo_coeff, mo_occ, spin=0,
     elif xctype == 'MGGA':
         raise NotImplementedError('meta-GGA')
 
+    if grids.coords is None:
+        grids.build(with_non0tab=True)
     nao = cell.nao_nr()
+    ngrids = grids.weights.size
+    if xctype == 'GGA':
+        rho_shape = (4, ngrids)
+    else:
+        rho_shape = (ngrids,)
+    # The density of each grid block is written to its slice of rho, instead
+    # of stacking the blocks at the end which holds two copies of rho.
     if spin == 0:
-        rho = []
+        rho = numpy.empty(rho_shape)
+        p1 = 0
         for ao_k1, ao_k2, mask, weight, coords \
                 in ni.block_loop(cell, grids, nao, ao_deriv, kpts, None, max_memory):
-            rho.append(ni.eval_rho2(cell, ao_k1, mo_coeff, mo_occ, mask, xctype))
-        rho = numpy.hstack(rho)
+            p0, p1 = p1, p1 + weight.size
+            rho[...,p0:p1] = ni.eval_rho2(cell, ao_k1, mo_coeff, mo_occ, mask, xctype)
     else:
-        rhoa = []
-        rhob = []
+        rhoa = numpy.empty(rho_shape)
+        rhob = numpy.empty(rho_shape)
+        p1 = 0
         for ao_k1, ao_k2, mask, weight, coords \
                 in ni.block_loop(cell, grids, nao, ao_deriv, kpts, None, max_memory):
-            rhoa.append(ni.eval_rho2(cell, ao_k1, mo_coeff[0], mo_occ[0], mask, xctype))
-            rhob.append(ni.eval_rho2(cell, ao_k1, mo_coeff[1], mo_occ[1], mask, xctype))
-        rho = (numpy.hstack(rhoa), numpy.hstack(rhob))
+            p0, p1 = p1, p1 + weight.size
+            rhoa[...,p0:p1] = ni.eval_rho2(cell, ao_k1, mo_coeff[0], mo_occ[0], mask, xctype)
+            rhob[...,p0:p1] = ni.eval_rho2(cell, ao_k1, mo_coeff[1], mo_occ[1], mask, xctype)
+        rho = (rhoa, rhob)
     vxc, fxc = ni.eval_xc(xc_code, rho, spin, 0, 2, 0)[1:3]
     return rho, vxc, fxc
 
@@ -929,7 +965,27 @@ def get_rho(ni, cell, dm, grids, kpts=numpy.zeros((1,3)), max_memory=2000):
 class NumInt(numint.NumInt):
     '''Generalization of pyscf's NumInt class for a single k-point shift and
     periodic images.
+
+    Attributes:
+        cache_ao : bool
+            Whether to keep the AO values on grids in memory and reuse them
+            in the next call of block_loop (e.g. in the next SCF iteration).
+            The cache takes up to half of the free memory under
+            cell.max_memory.  It can be released by :meth:`clear_ao_cache`.
+            Default is False.
     '''
+    cache_ao = getattr(__config__, 'pbc_dft_numint_NumInt_cache_ao', False)
+
+    def __init__(self):
+        numint.NumInt.__init__(self)
+        # AO values kept by block_loop to be reused in the next call
+        self._ao_cache = None
+
+    def clear_ao_cache(self):
+        '''Release the AO values cached by block_loop'''
+        self._ao_cache = None
+        return self
+
     def eval_ao(self, cell, coords, kpt=numpy.zeros(3), deriv=0, relativity=0,
                 shls_slice=None, non0tab=None, out=None, verbose=None):
         return eval_ao(cell, coords, kpt, deriv, relativity, shls_slice,
@@ -992,7 +1048,12 @@ class NumInt(numint.NumInt):
                  non0tab=None, xctype='LDA', spin=0, verbose=None):
 # Guess whether ao is evaluated for kpts_band.  When xctype is LDA, ao on grids
 # should be a 2D array.  For other xc functional, ao should be a 3D array.
-        if ao.ndim == 2 or (xctype != 'LDA' and ao.ndim == 3):
+        if xctype == 'LDA' or xctype == 'HF':
+            if ao.ndim == 2:
+                mat = eval_mat(cell, ao, weight, rho, vxc, non0tab, xctype, spin, verbose)
+            else:
+                mat = _eval_mat_lda_kpts(cell, ao, weight, vxc, non0tab)
+        elif ao.ndim == 3:
             mat = eval_mat(cell, ao, weight, rho, vxc, non0tab, xctype, spin, verbose)
         else:
             nkpts = len(ao)
@@ -1021,6 +1082,9 @@ class NumInt(numint.NumInt):
         if blksize is None:
             blksize = int(max_memory*1e6/(comp*2*nao*16*BLKSIZE))*BLKSIZE
             blksize = max(BLKSIZE, min(blksize, ngrids, BLKSIZE*1200))
+        cacheable = self.cache_ao and non0tab is None
+        if not self.cache_ao:
+            self._ao_cache = None
         if non0tab is None:
             non0tab = grids.non0tab
         if non0tab is None:
@@ -1031,22 +1095,78 @@ class NumInt(numint.NumInt):
         if kpts_band is None:
             kpt1 = kpt2 = kpt
         else:
-            kpt1 = kpts_band
+            kpt1 = numpy.reshape(kpts_band, (-1,3))
+            if len(kpt1) == 1:
+                kpt1 = kpt1[0]
             kpt2 = kpt
+        same_kpt = abs(kpt1-kpt2).sum() < 1e-9
+
+# cell, grids and k-points are not changed between SCF iterations. If the AO
+# values of all blocks fit in memory, they are kept for the next call.
+# grids.non0tab is regenerated whenever grids are rebuilt (UniformGrids
+# generates a new coords array on every access). References to the objects in
+# the key are held by the cache so that their ids cannot be reused.
+        cache_key = (id(cell._env), id(cell._bas), id(grids), id(grids.non0tab),
+                     ngrids, deriv, blksize,
+                     numpy.asarray(kpt1).tobytes(), kpt2.tobytes())
+        if cacheable and self._ao_cache is not None:
+            if self._ao_cache[0] == cache_key:
+                for ip0, ao_k1, ao_k2 in self._ao_cache[2]:
+                    ip1 = min(ngrids, ip0+blksize)
+                    yield (ao_k1, ao_k2, non0tab[ip0//BLKSIZE:],
+                           grids_weights[ip0:ip1], grids_coords[ip0:ip1])
+                return
+            self._ao_cache = None
+
+        if same_kpt:
+            nkpts = 1
+        else:
+            nkpts = 1 + len(numpy.reshape(kpt1, (-1,3)))
+        if cacheable:
+# The max_memory argument is the budget of one call (nr_rks is called with the
+# default 2000 MB by the SCF code).  The cache lives across calls and is
+# checked against the memory limit of the cell.
+            cache_size = comp * ngrids * nao * nkpts * 16e-6
+            mem_avail = cell.max_memory - lib.current_memory()[0]
+            cacheable = cache_size < mem_avail * .5
+            if not cacheable:
+                logger.debug(cell, 'AO values (%.0f MB) are not cached. '
+                             'Available memory %.0f MB', cache_size, mem_avail)
+        cached_blocks = []
+        if cacheable:
+            buf = None
+        else:
+            # AO values of kpt of all blocks are written into the same buffer
+            buf = numpy.empty((comp,blksize,nao), dtype=numpy.complex128)
 
         for ip0 in range(0, ngrids, blksize):
             ip1 = min(ngrids, ip0+blksize)
             coords = grids_coords[ip0:ip1]
             weight = grids_weights[ip0:ip1]
             non0 = non0tab[ip0//BLKSIZE:]
-            ao_k2 = self.eval_ao(cell, coords, kpt2, deriv=deriv, non0tab=non0)
-            if abs(kpt1-kpt2).sum() < 1e-9:
-                ao_k1 = ao_k2
+            if same_kpt:
+                ao_k1 = ao_k2 = self.eval_ao(cell, coords, kpt2, deriv=deriv,
+                                             non0tab=non0, out=buf)
             else:
-                ao_k1 = self.eval_ao(cell, coords, kpt1, deriv=deriv)
+                ao_k2 = self.eval_ao(cell, coords, kpt2, deriv=deriv,
+                                     non0tab=non0, out=buf)
+                if kpt1.ndim == 1:
+                    ao_k1 = self.eval_ao(cell, coords, kpt1, deriv=deriv,
+                                         non0tab=non0)
+                else:
+# AOs of multiple band k-points are stacked in one array, as assumed by eval_mat
+                    ao_k1 = numpy.asarray([self.eval_ao(cell, coords, k, deriv=deriv,
+                                                        non0tab=non0)
+                                           for k in kpt1])
+            if cacheable:
+                cached_blocks.append((ip0, ao_k1, ao_k2))
             yield ao_k1, ao_k2, non0, weight, coords
             ao_k1 = ao_k2 = None
 
+        if cacheable:
+            self._ao_cache = (cache_key, (cell._env, cell._bas, grids,
+                                          grids.non0tab), cached_blocks)
+
     def _gen_rho_evaluator(self, cell, dms, hermi=0):
         return numint.NumInt._gen_rho_evaluator(self, cell, dms, hermi)
 
@@ -1157,6 +1277,8 @@ class KNumInt(numint.NumInt):
 
     def eval_mat(self, cell, ao_kpts, weight, rho, vxc,
                  non0tab=None, xctype='LDA', spin=0, verbose=None):
+        if xctype == 'LDA' or xctype == 'HF':
+            return _eval_mat_lda_kpts(cell, ao_kpts, weight, vxc, non0tab)
         nkpts = len(ao_kpts)
         nao = ao_kpts[0].shape[-1]
         dtype = numpy.result_type(*ao_kpts)
@@ -1200,15 +1322,37 @@ class KNumInt(numint.NumInt):
             kpts_band = numpy.reshape(kpts_band, (-1,3))
             where = [member(k, kpts) for k in kpts_band]
             where = [k_id[0] if len(k_id)>0 else None for k_id in where]
+# AOs of the band k-points which are not in kpts are evaluated together with
+# kpts in one lattice summation. The others are taken from the AOs of kpts.
+            band_idx = []
+            kpts_all = [kpts]
+            nkpts_all = nkpts
+            for k, k_id in zip(kpts_band, where):
+                if k_id is None:
+                    band_idx.append(nkpts_all)
+                    kpts_all.append(k.reshape(1,3))
+                    nkpts_all += 1
+                else:
+                    band_idx.append(k_id)
+            kpts_all = numpy.vstack(kpts_all)
+        else:
+            nkpts_all = nkpts
+        buf = numpy.empty((nkpts_all,comp,blksize,nao), dtype=numpy.complex128)
 
         for ip0 in range(0, ngrids, blksize):
             ip1 = min(ngrids, ip0+blksize)
             coords = grids_coords[ip0:ip1]
             weight = grids_weights[ip0:ip1]
             non0 = non0tab[ip0//BLKSIZE:]
-            ao_k1 = ao_k2 = self.eval_ao(cell, coords, kpts, deriv=deriv, non0tab=non0)
-            if kpts_band is not None:
-                ao_k1 = self.eval_ao(cell, coords, kpts_band, deriv=deriv, non0tab=non0)
+            if kpts_band is None:
+                ao_k1 = ao_k2 = self.eval_ao(cell, coords, kpts, deriv=deriv,
+                                             non0tab=non0, out=buf)
+            else:
+                ao_kpts = self.eval_ao(cell, coords, kpts_all, deriv=deriv,
+                                       non0tab=non0, out=buf)
+                ao_k2 = ao_kpts[:nkpts]
+                ao_k1 = [ao_kpts[k] for k in band_idx]
+                ao_kpts = None
             yield ao_k1, ao_k2, non0, weight, coords
             ao_k1 = ao_k2 = None
 
@@ -69,6 +69,20 @@ def make_grids(mesh):
     return cell, grids
 
 
+def make_he2_grids():
+    cell = pbcgto.Cell()
+    cell.verbose = 0
+    cell.a = np.eye(3) * 2.5
+    cell.mesh = [21]*3
+    cell.atom = [['He', (1., .8, 1.9)],
+                 ['He', (.1, .2,  .3)],]
+    cell.basis = 'ccpvdz'
+    cell.build(False, False)
+    grids = gen_grid.UniformGrids(cell)
+    grids.build()
+    return cell, grids
+
+
 class KnowValues(unittest.TestCase):
     def test_eval_ao(self):
         cell = pbcgto.Cell()
@@ -141,6 +155,52 @@ class KnowValues(unittest.TestCase):
         self.assertAlmostEqual(finger(ao1[2]), (-1.1937974302337684-0.39039259235266233j), 8)
         self.assertAlmostEqual(finger(ao1[3]), (0.17701966968272009-0.20232879692603079j), 8)
 
+        kpts[0] = 0
+        ngrids, nao = ao1[0].shape
+        buf = np.empty(4*ngrids*nao, dtype=np.complex128)
+        ao0 = ni.eval_ao(cell, grids.coords, kpts)
+        ao1 = ni.eval_ao(cell, grids.coords, kpts, out=buf)
+        self.assertTrue(ao1[0].dtype == np.double)
+        for k in range(4):
+            self.assertTrue(np.shares_memory(ao1[k], buf))
+            self.assertAlmostEqual(abs(ao1[k] - ao0[k]).max(), 0, 12)
+
+    def test_block_loop_kpts_band(self):
+        cell, grids = make_he2_grids()
+        nao = cell.nao_nr()
+        blksize = numint.BLKSIZE * 20
+
+        np.random.seed(1)
+        kpts = np.random.random((3,3))
+        # kpts_band[0] is not in kpts; kpts_band[1] is kpts[2]
+        kpts_band = np.vstack((np.random.random(3), kpts[2]))
+        ni = numint.KNumInt(kpts)
+        p1 = 0
+        for ao_k1, ao_k2, mask, weight, coords \
+                in ni.block_loop(cell, grids, nao, 1, kpts, kpts_band,
+                                 blksize=blksize):
+            p0, p1 = p1, p1 + weight.size
+            ref_k2 = ni.eval_ao(cell, coords, kpts, deriv=1)
+            ref_k1 = ni.eval_ao(cell, coords, kpts_band, deriv=1)
+            self.assertEqual(len(ao_k2), 3)
+            self.assertEqual(len(ao_k1), 2)
+            for k in range(3):
+                self.assertAlmostEqual(abs(ao_k2[k] - ref_k2[k]).max(), 0, 12)
+            for k in range(2):
+                self.assertAlmostEqual(abs(ao_k1[k] - ref_k1[k]).max(), 0, 12)
+        self.assertEqual(p1, grids.weights.size)
+
+        ni = numint.NumInt()
+        for ao_k1, ao_k2, mask, weight, coords \
+                in ni.block_loop(cell, grids, nao, 0, kpts[0], kpts_band,
+                                 blksize=blksize):
+            ref_k2 = ni.eval_ao(cell, coords, kpts[0])
+            self.assertEqual(ao_k1.shape, (2,) + ref_k2.shape)
+            self.assertAlmostEqual(abs(ao_k2 - ref_k2).max(), 0, 12)
+            for k in range(2):
+                ref_k1 = ni.eval_ao(cell, coords, kpts_band[k])
+                self.assertAlmostEqual(abs(ao_k1[k] - ref_k1).max(), 0, 12)
+
     def test_eval_ao_kpt(self):
         cell = pbcgto.Cell()
         cell.verbose = 5
@@ -202,6 +262,65 @@ class KnowValues(unittest.TestCase):
         self.assertAlmostEqual(finger(vmat[1][0]), -2348.9577179701278-60.733087913116719j, 7)
         self.assertAlmostEqual(finger(vmat[1][1]), -2353.0350086740673-117.74811536967495j, 7)
 
+    def test_nr_rks_ao_cache(self):
+        cell, grids = make_he2_grids()
+        nao = cell.nao_nr()
+
+        np.random.seed(1)
+        kpt = np.random.random(3)
+        dms = np.random.random((2,nao,nao))
+        dms = (dms + dms.transpose(0,2,1)) * .5
+        ni = numint.NumInt()
+        ni.nr_rks(cell, grids, 'blyp', dms[0], 0, kpt)
+        self.assertTrue(ni._ao_cache is None)
+
+        ni.cache_ao = True
+        eval_ao_calls = []
+        def eval_ao(*args, **kwargs):
+            eval_ao_calls.append(1)
+            return numint.NumInt.eval_ao(ni, *args, **kwargs)
+        ni.eval_ao = eval_ao
+        ni.nr_rks(cell, grids, 'blyp', dms[0], 0, kpt)
+        nblks = len(eval_ao_calls)
+        self.assertTrue(nblks > 0)
+        self.assertEqual(len(ni._ao_cache[2]), nblks)
+
+        # The second call takes all AOs from the cache
+        ne, exc, vmat = ni.nr_rks(cell, grids, 'blyp', dms[1], 0, kpt)
+        self.assertEqual(len(eval_ao_calls), nblks)
+        ref = numint.NumInt().nr_rks(cell, grids, 'blyp', dms[1], 0, kpt)
+        self.assertAlmostEqual(ne, ref[0], 9)
+        self.assertAlmostEqual(exc, ref[1], 9)
+        self.assertAlmostEqual(abs(vmat - ref[2]).max(), 0, 9)
+        cached = ni._ao_cache[2]
+        for blk, (ao_k1, ao_k2, mask, weight, coords) \
+                in zip(cached, ni.block_loop(cell, grids, nao, 1, kpt)):
+            self.assertTrue(ao_k2 is blk[2])
+        self.assertEqual(len(eval_ao_calls), nblks)
+
+        # Rebuilding grids invalidates the cache
+        grids.build()
+        ni.nr_rks(cell, grids, 'blyp', dms[1], 0, kpt)
+        self.assertEqual(len(eval_ao_calls), nblks * 2)
+
+        ni.clear_ao_cache()
+        self.assertTrue(ni._ao_cache is None)
+
+    def test_cache_xc_kernel_unbuilt_grids(self):
+        cell = make_he2_grids()[0]
+        grids = gen_grid.BeckeGrids(cell)
+        grids.level = 1
+        nao = cell.nao_nr()
+        np.random.seed(1)
+        mo_coeff = np.random.random((nao,nao))
+        mo_occ = np.zeros(nao)
+        mo_occ[:2] = 2
+        ni = numint.NumInt()
+        rho, vxc, fxc = ni.cache_xc_kernel(cell, grids, 'lda,vwn', mo_coeff, mo_occ)
+        self.assertEqual(rho.shape, grids.weights.shape)
+        ref = ni.get_rho(cell, np.dot(mo_coeff*mo_occ, mo_coeff.T), grids)
+        self.assertAlmostEqual(abs(rho - ref).max(), 0, 9)
+
     def test_eval_rho(self):
         cell, grids = make_grids([61]*3)
         numpy.random.seed(10)
@@ -236,6 +355,53 @@ class KnowValues(unittest.TestCase):
         rho1 = numint.eval_rho(cell, ao[0], dm, xctype='LDA')
         self.assertAlmostEqual(finger(rho1), -17.198879910245601, 7)
 
+        rho1 = numint.eval_rho(cell, ao, dm+0j, xctype='MGGA')
+        self.assertTrue(numpy.allclose(rho0, rho1))
+
+    def test_eval_rho_real_ao_complex_dm(self):
+        cell, grids = make_grids([61]*3)
+        numpy.random.seed(10)
+        nao = 10
+        ngrids = 500
+        ao = numpy.random.random((4,ngrids,nao))
+        dm = numpy.random.random((nao,nao)) + numpy.random.random((nao,nao))*1j
+        dm = dm + dm.conj().T
+        rho0 = numpy.einsum('pi,ij,pj->p', ao[0], dm, ao[0]).real
+        rho1 = numint.eval_rho(cell, ao[0], dm, xctype='LDA')
+        self.assertTrue(numpy.allclose(rho0, rho1))
+        rho1 = numint.eval_rho(cell, ao, dm, xctype='GGA')
+        self.assertTrue(numpy.allclose(rho0, rho1[0]))
+        rho0 = numpy.einsum('pi,ij,pj->p', ao[1], dm, ao[0]).real * 2
+        self.assertTrue(numpy.allclose(rho0, rho1[1]))
+
+    def test_eval_rho2_neg_occ(self):
+        cell, grids = make_grids([61]*3)
+        numpy.random.seed(10)
+        nao = 10
+        ngrids = 500
+        ao =(numpy.random.random((10,ngrids,nao)) +
+             numpy.random.random((10,ngrids,nao))*1j)
+        ao = ao.transpose(0,2,1).copy().transpose(0,2,1)
+        mo_coeff = (numpy.random.random((nao,nao)) +
+                    numpy.random.random((nao,nao))*1j)
+        mo_occ = numpy.random.random(nao) - .5
+        dm = numpy.dot(mo_coeff*mo_occ, mo_coeff.conj().T)
+        for xctype, comp in (('LDA', 0), ('GGA', 4), ('MGGA', 10)):
+            if comp == 0:
+                ao1 = ao[0]
+            else:
+                ao1 = ao[:comp]
+            rho0 = numint.eval_rho(cell, ao1, dm, xctype=xctype, hermi=1)
+            rho1 = numint.eval_rho2(cell, ao1, mo_coeff, mo_occ, xctype=xctype)
+            self.assertTrue(numpy.allclose(rho0, rho1))
+
+        # The density is linear in the occupancies.  Negative occupancies used
+        # to add the tau and laplacian terms with the wrong sign for meta-GGA.
+        mo_occ = abs(mo_occ)
+        rho0 = numint.eval_rho2(cell, ao, mo_coeff, mo_occ, xctype='MGGA')
+        rho1 = numint.eval_rho2(cell, ao, mo_coeff, -mo_occ, xctype='MGGA')
+        self.assertAlmostEqual(abs(rho0 + rho1).max(), 0, 9)
+
     def test_eval_mat(self):
         cell, grids = make_grids([61]*3)
         numpy.random.seed(10)
@@ -250,6 +416,12 @@ class KnowValues(unittest.TestCase):
         mat0 = numpy.einsum('pi,p,pj->ij', ao[0].conj(), weight*vxc[0], ao[0])
         mat1 = numint.eval_mat(cell, ao[0], weight, rho, vxc, xctype='LDA')
         self.assertTrue(numpy.allclose(mat0, mat1))
+        # Fortran-ordered AOs, as returned by eval_ao, go through the ZGEMM
+        # conjugate-transpose path of _dot_ao_ao
+        mat1 = numint.eval_mat(cell, numpy.asarray(ao[0], order='F'),
+                               weight, rho, vxc, xctype='LDA')
+        self.assertTrue(mat1.flags.c_contiguous)
+        self.assertTrue(numpy.allclose(mat0, mat1))
 
         vrho, vsigma = vxc[:2]
         wv = weight * vsigma * 2
@@ -266,6 +438,15 @@ class KnowValues(unittest.TestCase):
         mat1 = numint.eval_mat(cell, ao[0], weight, rho, vxc, xctype='LDA')
         self.assertAlmostEqual(finger(mat1), 10.483493302918024+3.5590312220458227j, 7)
 
+        mat1 = numint.KNumInt().eval_mat(cell, ao[:2], weight, rho, vxc, xctype='LDA')
+        mat0 = numint.eval_mat(cell, ao[1], weight, rho, vxc, xctype='LDA')
+        self.assertAlmostEqual(abs(mat1[1] - mat0).max(), 0, 12)
+        self.assertAlmostEqual(finger(mat1[0]), 10.483493302918024+3.5590312220458227j, 7)
+
+        mat1 = numint.NumInt().eval_mat(cell, ao[:2], weight, rho, vxc, xctype='HF')
+        self.assertEqual(mat1.shape, (2,nao,nao))
+        self.assertAlmostEqual(abs(mat1[1] - mat0).max(), 0, 12)
+
     def test_2d_rho(self):
         cell = pbcgto.Cell()
         cell.a = '5 0 0; 0 5 0; 0 0 1'
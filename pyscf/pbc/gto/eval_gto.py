@@ -20,6 +20,7 @@ import ctypes
 import numpy
 from pyscf import lib
 from pyscf.gto import moleintor
+from pyscf.gto.mole import ATOM_OF
 from pyscf.gto.eval_gto import _get_intor_and_comp
 from pyscf.pbc.gto import _pbcintor
 from pyscf import __config__
@@ -64,7 +65,9 @@ def eval_gto(cell, eval_name, coords, comp=None, kpts=None, kpt=None,
             mask array to indicate whether the AO values are zero.  The mask
             array can be obtained by calling :func:`dft.gen_grid.make_mask`
         out : ndarray
-            If provided, results are written into this array.
+            If provided, results are written into this array.  It needs to
+            be large enough to hold the complex AO values of all k-points.
+            The returned AO arrays share the memory of out.
 
     Returns:
         A list of 2D (or 3D) arrays to hold the AO values on grids.  Each
@@ -123,7 +126,9 @@ def eval_gto(cell, eval_name, coords, comp=None, kpts=None, kpt=None,
     sh0, sh1 = shls_slice
     nao = ao_loc[sh1] - ao_loc[sh0]
 
-    out = numpy.empty((nkpts,comp,nao,ngrids), dtype=numpy.complex128)
+    buf = out
+    out = numpy.ndarray((nkpts,comp,nao,ngrids), dtype=numpy.complex128,
+                        buffer=buf)
     coords = numpy.asarray(coords, order='F')
 
     # For atoms near the boundary of the cell, it is necessary (even in low-
@@ -133,9 +138,20 @@ def eval_gto(cell, eval_name, coords, comp=None, kpts=None, kpt=None,
     else:
         Ls = cell.get_lattice_Ls(dimension=3)
     Ls = Ls[numpy.argsort(lib.norm(Ls, axis=1))]
-    expLk = numpy.exp(1j * numpy.asarray(numpy.dot(Ls, kpts_lst.T), order='C'))
     rcut = _estimate_rcut(cell)
-
+    Ls = _screen_Ls(cell, Ls, coords, rcut, shls_slice)
+    # expLk is filled from cos and sin of kL directly.  The C driver reads it
+    # as interleaved (cos, sin) pairs: for each shell and grid block, the real
+    # AO values of a batch of IMGBLK images are contracted with the phases by
+    # one DGEMM.
+    kL = numpy.dot(Ls, kpts_lst.T)
+    expLk = numpy.empty(kL.shape, dtype=numpy.complex128)
+    numpy.cos(kL, out=expLk.real)
+    numpy.sin(kL, out=expLk.imag)
+
+    # The driver is OpenMP parallel over (grid block, shell) tasks. Each task
+    # sums all images into its own slice of out, so no thread-private copies
+    # of out or reductions are needed. ctypes releases the GIL for the call.
     drv = getattr(libpbc, eval_name)
     drv(ctypes.c_int(ngrids),
         (ctypes.c_int*2)(*shls_slice), ao_loc.ctypes.data_as(ctypes.c_void_p),
@@ -153,7 +169,11 @@ def eval_gto(cell, eval_name, coords, comp=None, kpts=None, kpt=None,
     for k, kpt in enumerate(kpts_lst):
         v = out[k]
         if abs(kpt).sum() < 1e-9:
-            v = numpy.asarray(v.real, order='C')
+            if buf is None:
+                v = numpy.asarray(v.real, order='C')
+            else:
+                # Keep the real AO values in the caller's buffer
+                v = _compact_real(v)
         v = v.transpose(0,2,1)
         if comp == 1:
             v = v[0]
@@ -180,6 +200,43 @@ def _estimate_rcut(cell):
         rcut.append(r.max())
     return numpy.array(rcut)
 
+def _compact_real(v):
+    '''Move the real part of the C-contiguous complex array v to the first
+    half of its own memory.  The real parts are copied forward in chunks
+    [i, 2i) whose destination ends before their source begins, so that numpy
+    does not create a temporary copy for the overlapping views.'''
+    n = v.size
+    src = v.reshape(-1).real
+    dst = numpy.ndarray(n, buffer=v)
+    if n > 0:
+        dst[0] = src[0]
+    i0 = 1
+    while i0 < n:
+        i1 = min(i0*2, n)
+        dst[i0:i1] = src[i0:i1]
+        i0 = i1
+    return dst.reshape(v.shape)
+
+def _screen_Ls(cell, Ls, coords, rcut, shls_slice):
+    '''Remove the lattice translations which have no contributions to the
+    given grids.  An image is dropped if all shifted atoms are farther than
+    the shell cutoff radius to the bounding box of the grids.  The order of
+    the remaining Ls is preserved.'''
+    if len(coords) == 0:
+        return Ls
+    sh0, sh1 = shls_slice
+    rcut_atm = numpy.zeros(cell.natm)
+    numpy.maximum.at(rcut_atm, cell._bas[sh0:sh1,ATOM_OF], rcut[sh0:sh1])
+
+    coords_min = coords.min(axis=0)
+    coords_max = coords.max(axis=0)
+    rL = Ls.reshape(-1,1,3) + cell.atom_coords()
+    dr = numpy.maximum(coords_min - rL, 0) + numpy.maximum(rL - coords_max, 0)
+    dist = numpy.sqrt(numpy.einsum('lax,lax->la', dr, dr))
+    mask = (dist < rcut_atm).any(axis=1)
+    mask[0] = True  # Keep at least one image for the C driver
+    return numpy.asarray(Ls[mask], order='C')
+
 
 if __name__ == '__main__':
     from pyscf.pbc import gto, dft
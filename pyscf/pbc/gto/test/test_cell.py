@@ -327,6 +327,42 @@ class KnownValues(unittest.TestCase):
         self.assertEqual(len(b[0][1]), 4)
         self.assertEqual(len(b[1][1]), 2)
 
+    def test_screen_Ls(self):
+        from pyscf import lib
+        from pyscf.pbc.gto import eval_gto
+        cell = pgto.Cell()
+        cell.build(unit = 'B',
+                   a = numpy.eye(3) * 4,
+                   mesh = [11]*3,
+                   atom = 'He 2 2 2',
+                   basis = {'He': [[0, (2.5, 1.)], [1, (1.5, 1.)]]})
+        # grids in one corner of the cell
+        coords = numpy.random.random((200,3)) * .5
+        Ls = cell.get_lattice_Ls(dimension=3)
+        Ls = Ls[numpy.argsort(lib.norm(Ls, axis=1))]
+        rcut = eval_gto._estimate_rcut(cell)
+        Ls1 = eval_gto._screen_Ls(cell, Ls, coords, rcut, (0,cell.nbas))
+        self.assertTrue(len(Ls1) < len(Ls))
+
+        kpts = cell.make_kpts([2,1,1])
+        ao = cell.pbc_eval_gto('GTOval_sph_deriv1', coords, kpts=kpts)
+        screen_Ls = eval_gto._screen_Ls
+        try:
+            eval_gto._screen_Ls = lambda cell, Ls, *args: Ls
+            ref = cell.pbc_eval_gto('GTOval_sph_deriv1', coords, kpts=kpts)
+        finally:
+            eval_gto._screen_Ls = screen_Ls
+        for k in range(len(kpts)):
+            self.assertAlmostEqual(abs(ao[k] - ref[k]).max(), 0, 9)
+
+    def test_compact_real(self):
+        from pyscf.pbc.gto import eval_gto
+        for shape in [(1,), (7,), (2,5,33)]:
+            v = numpy.random.random(shape) + numpy.random.random(shape) * 1j
+            ref = v.real.copy()
+            vr = eval_gto._compact_real(v)
+            self.assertTrue(numpy.shares_memory(vr, v))
+            self.assertAlmostEqual(abs(vr - ref).max(), 0, 14)
 
 if __name__ == '__main__':
     print("Full Tests for pbc.gto.cell")
@@ -439,11 +439,16 @@ def get_lattice_Ls(cell, nimgs=None, rcut=None, dimension=None):
                              np.arange(-nimgs[1],nimgs[1]+1),
                              np.arange(-nimgs[2],nimgs[2]+1)))
     Ls = np.dot(Ts, a)
-    idx = np.zeros(len(Ls), dtype=bool)
-    for ax in (-a[0], 0, a[0]):
-        for ay in (-a[1], 0, a[1]):
-            for az in (-a[2], 0, a[2]):
-                idx |= lib.norm(Ls+(ax+ay+az), axis=1) < rcut
+    #:idx = np.zeros(len(Ls), dtype=bool)
+    #:for ax in (-a[0], 0, a[0]):
+    #:    for ay in (-a[1], 0, a[1]):
+    #:        for az in (-a[2], 0, a[2]):
+    #:            idx |= lib.norm(Ls+(ax+ay+az), axis=1) < rcut
+    shifts = np.dot(lib.cartesian_prod(([-1,0,1],)*3), a)
+    # |L+s|^2 = |L|^2 + 2 L.s + |s|^2 for all 27 shifts in one matmul
+    rr = np.einsum('ix,ix->i', Ls, Ls)[:,None] + 2*np.dot(Ls, shifts.T)
+    rr += np.einsum('ix,ix->i', shifts, shifts)
+    idx = (rr < rcut**2).any(axis=1)
     Ls = Ls[idx]
     return np.asarray(Ls, order='C')
 